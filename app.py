@@ -2,68 +2,158 @@
 import streamlit as st
 import os
 import sys
-import io
 import traceback
-from typing import List, Dict, Any
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import List, Dict, Any, Iterator
 
 # Keep project root on path so utils and models import works when running from this file.
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 
-# Import project modules.
-from models.llm import get_chatgroq_model
-from utils.rag_utils import retrieve, chunk_text, index_documents
-from utils.web_search import serpapi_search
+# Import project modules. Modules that pull in faiss, torch, numba or the Groq client are
+# imported inside the functions that use them so the Instructions page renders without them.
+from config.config import SPECULATIVE_WEB_SEARCH, SERPAPI_KEY
 
 # --- Helper functions -------------------------------------------------------------------
 
-def build_context_for_query(query, top_k=4):
-    """Get top-k docs from Chroma and return a single context string to pass to the LLM."""
+def build_context_for_query(query, top_k=4, query_vec=None, chat_model=None):
+    """Get top-k docs from the vector store and return a single context string to pass to the LLM.
+
+    If documents are indexed but none are relevant and a chat_model is given, retry once with a
+    HyDE passage before giving up.
+    """
+    from utils.rag_utils import retrieve, hyde_query, select_context_docs
     try:
-        docs = retrieve(query, k=top_k)
+        docs = retrieve(query, k=top_k, query_vec=query_vec)
     except Exception as e:
         return ""
 
     if not docs:
         return ""  # no docs
 
-    # Filter out low-similarity docs
-    relevant_docs = [d for d in docs if d.get("distance", 100) < 1.5]
+    # Filter out low-similarity docs (cosine distance, 0 = identical).
+    relevant_docs = [d for d in docs if d.get("distance", 100) < 0.4]
+    if not relevant_docs and chat_model is not None:
+        try:
+            passage = hyde_query(chat_model, query)
+            docs = retrieve(passage, k=top_k)
+            relevant_docs = [d for d in docs if d.get("distance", 100) < 0.4]
+        except Exception:
+            relevant_docs = []
     if not relevant_docs:
         return ""  # fallback will trigger
 
+    # Drop overlapping chunks and keep the prompt within the token budget.
+    relevant_docs = select_context_docs(relevant_docs, max_tokens=1500)
+
     pieces = []
     for i, d in enumerate(relevant_docs):
         pieces.append(f"Source {i+1} (score {d.get('distance',0):.4f}): {d['text']}")
     return "\n\n---\n\n".join(pieces)
 
 
-def get_chat_response(chat_model, messages: List[Dict[str, str]], system_prompt: str, retrieval_context: str, response_mode: str = "detailed") -> str:
-    """Compose messages and call the GROQ chat model with optional retrieval context and response-mode instructions."""
-    try:
-        formatted = [SystemMessage(content=system_prompt)]
-        # Inject retrieval context as additional system message if present.
-        if retrieval_context:
-            formatted.append(SystemMessage(content=f"Relevant context from documents:\n{retrieval_context}"))
-        # Append conversation history.
-        for msg in messages:
-            if msg.get("role") == "user":
-                formatted.append(HumanMessage(content=msg.get("content", "")))
+async def _gather_context_async(query, query_vec=None, chat_model=None):
+    """Run retrieval and the web-search fallback concurrently; return (context, used_web_search)."""
+    from utils.rag_utils import CONTEXT_EXECUTOR
+    from utils.web_search import serpapi_search
+    loop = asyncio.get_running_loop()
+    web_fut = loop.run_in_executor(CONTEXT_EXECUTOR, serpapi_search, query, 3)
+    retrieval_context = await loop.run_in_executor(CONTEXT_EXECUTOR, build_context_for_query, query, 4, query_vec, chat_model)
+    if retrieval_context:
+        web_fut.cancel()  # docs found: the web result is discarded
+        return retrieval_context, False
+    snippets = await web_fut
+    return ("\n\n".join(snippets), True) if snippets else ("", False)
+
+
+def gather_context(query, query_vec=None, chat_model=None):
+    """Return (context, used_web_search): document context, or web snippets when no docs match."""
+    # A started search cannot be cancelled (and is billed), so only speculate when opted in and a key is set.
+    if SPECULATIVE_WEB_SEARCH and SERPAPI_KEY:
+        return asyncio.run(_gather_context_async(query, query_vec=query_vec, chat_model=chat_model))
+
+    retrieval_context = build_context_for_query(query, top_k=4, query_vec=query_vec, chat_model=chat_model)
+    if retrieval_context:
+        return retrieval_context, False
+
+    # If no docs found, attempt fallback web search snippets.
+    from utils.web_search import serpapi_search
+    snippets = serpapi_search(query, num_results=3)
+    return ("\n\n".join(snippets), True) if snippets else ("", False)
+
+
+def add_chat_message(role: str, content: str):
+    """Append a turn to the displayed history and to the cached LangChain message list."""
+    st.session_state.messages.append({"role": role, "content": content})
+    message_cls = HumanMessage if role == "user" else AIMessage
+    st.session_state.formatted_history.append(message_cls(content=content))
+
+
+MODE_HINTS = {
+    "concise": "Be concise: 2-3 sentences max, direct answers only, no examples or background.",
+    "detailed": "Be detailed: 5+ sentences with examples, step-by-step reasoning, context, and best practices.",
+}
+
+
+def build_base_system_prompt(system_prompt: str, response_mode: str) -> str:
+    """Return the user's system prompt plus the response-mode hint, identical across turns."""
+    hint = MODE_HINTS["concise"] if response_mode.lower() == "concise" else MODE_HINTS["detailed"]
+    return "\n\n".join(part for part in (system_prompt.strip(), hint) if part)
+
+
+def get_chat_response_stream(chat_model, history: List[BaseMessage], system_prompt: str, retrieval_context: str, response_mode: str = "detailed") -> Iterator[str]:
+    """Compose messages and stream the GROQ chat model's reply token by token, with optional retrieval context and response-mode instructions."""
+    # A single system message with a stable prefix keeps Groq's prompt cache warm across turns.
+    system_content = build_base_system_prompt(system_prompt, response_mode)
+    if retrieval_context:
+        system_content += f"\n\nContext:\n{retrieval_context}"
+    formatted = [SystemMessage(content=system_content)]
+    # Append conversation history (already converted to LangChain messages).
+    formatted.extend(history)
+    # Stream model output; chunk objects are assumed to have '.content'.
+    for chunk in chat_model.stream(formatted):
+        content = getattr(chunk, "content", "")
+        if content:
+            yield content
+
+
+def _parse_and_chunk(file_bytes: bytes, fname: str, pdf_pool=None) -> List[Dict[str, Any]]:
+    """Extract text from an uploaded file and return its chunks as docs ready for indexing.
+
+    PDFs are parsed in pdf_pool (a process pool) when one is given, otherwise in this thread.
+    """
+    from utils.rag_utils import chunk_text
+    # (page number, text) pairs; page is None for plain text files.
+    pages = []
+    # Handle PDF using PyMuPDF if available.
+    if fname.lower().endswith(".pdf"):
+        try:
+            from utils.pdf_utils import extract_pdf_pages
+            if pdf_pool is not None:
+                pages = pdf_pool.submit(extract_pdf_pages, file_bytes).result()
             else:
-                formatted.append(AIMessage(content=msg.get("content", "")))
-        # Response mode hints.
-        if response_mode.lower() == "concise":
-            formatted.append(SystemMessage(content="Be concise: 2-3 sentences max, direct answers only, no examples or background."))
-        else:
-            formatted.append(SystemMessage(content="Be detailed: 5+ sentences with examples, step-by-step reasoning, context, and best practices."))
-        # Call model.
-        response = chat_model.invoke(formatted)
-        # Model response object assumed to have '.content'.
-        return getattr(response, "content", str(response))
-    except Exception as e:
-        tb = traceback.format_exc()
-        return f"Error getting response: {str(e)}.\n\nTraceback:\n{tb}"
+                pages = extract_pdf_pages(file_bytes)
+        except Exception:
+            # Fallback: try to decode bytes as text.
+            pages = [(None, file_bytes.decode("utf-8", errors="ignore"))]
+    else:
+        # Text/markdown files.
+        pages = [(None, file_bytes.decode("utf-8", errors="ignore"))]
+
+    # Chunk each page separately so metadata keeps the page it came from.
+    docs = []
+    for page_no, text in pages:
+        for i, c in enumerate(chunk_text(text)):
+            if page_no is None:
+                docs.append({"id": f"{fname}_chunk_{i}", "text": c, "meta": {"source": fname, "chunk": i}})
+            else:
+                docs.append({"id": f"{fname}_p{page_no}_chunk_{i}", "text": c, "meta": {"source": fname, "page": page_no, "chunk": i}})
+    return docs
+
 
 # --- Pages -----------------------------------------------------------------------------
 
@@ -79,7 +169,7 @@ def instructions_page():
     ```bash
     pip install -r requirements.txt
     ```
-    3. Required libraries include `streamlit`, `chromadb`, `sentence-transformers`, `langchain_groq`, `python-dotenv`.
+    3. Required libraries include `streamlit`, `faiss-cpu`, `sentence-transformers`, `langchain_groq`, `python-dotenv`.
     """)
 
     st.markdown("""
@@ -90,8 +180,24 @@ def instructions_page():
     GROQ_API_KEY=your_groq_api_key_here
     GROQ_MODEL=llama-3.1-8b-instant
     SERPAPI_KEY=your_serpapi_key_here
-    CHROMA_PERSIST_DIR=./chroma_db
+    # Opt-in: start the web search alongside retrieval. Lower latency on misses, but every turn makes a billed SerpAPI call.
+    SPECULATIVE_WEB_SEARCH=false
+    FAISS_INDEX_DIR=./faiss_index
+    # Vector storage in the FAISS index: none (float32), fp16 (half the memory) or int8 (a quarter).
+    EMBEDDING_QUANTIZATION=none
     EMBEDDING_MODEL_NAME=sentence-transformers/all-MiniLM-L6-v2
+    # Embedding device, e.g. cuda or cpu; leave empty to use CUDA when available.
+    EMBEDDING_DEVICE=
+    # Embedding runtime: torch, or onnx (requires `pip install optimum[onnxruntime]`).
+    EMBEDDING_BACKEND=torch
+    # Optional ONNX export to load with the onnx backend, e.g. onnx/model_qint8_avx2.onnx for INT8 on CPU.
+    EMBEDDING_ONNX_FILE=
+    # Where the semantic cache of previous answers is saved.
+    SEMANTIC_CACHE_PATH=./semantic_cache/index.faiss
+    # Minimum cosine similarity for a new question to reuse a cached answer.
+    SEMANTIC_CACHE_THRESHOLD=0.92
+    # Logging verbosity (DEBUG, INFO, WARNING, ...); unknown values fall back to INFO.
+    LOG_LEVEL=INFO
     ```
     """)
 
@@ -107,7 +213,7 @@ def instructions_page():
 
     st.markdown("""
     ## How RAG Works
-    - Upload documents on the Chat page to index them into ChromaDB using sentence-transformers embeddings.
+    - Upload documents on the Chat page to index them into a FAISS vector store using sentence-transformers embeddings.
     - When you ask a question, the app retrieves the top K document chunks and sends them as context to the Groq model.
     - If no relevant documents are found, a web-search fallback is used to provide context snippets.
     """)
@@ -117,7 +223,7 @@ def instructions_page():
     1. Go to the **Chat** page using the sidebar.
     2. Select **response mode**: `Detailed` or `Concise`.
     3. Optionally, set a **System Prompt** to customize the AI's personality or behavior.
-    4. Upload documents to index into ChromaDB.
+    4. Upload documents to index into the FAISS vector store.
     5. Type your question and get answers using either local documents or web search.
     """)
 
@@ -146,6 +252,8 @@ def chat_page():
     # Basic session_state defaults.
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "formatted_history" not in st.session_state:
+        st.session_state.formatted_history = []
     if "response_mode" not in st.session_state:
         st.session_state.response_mode = "Detailed"
     if "system_prompt" not in st.session_state:
@@ -158,6 +266,7 @@ def chat_page():
     # Try to initialize the Groq chat model.
     model_available = True
     try:
+        from models.llm import get_chatgroq_model
         chat_model = get_chatgroq_model()
     except Exception as e:
         chat_model = None
@@ -178,7 +287,7 @@ def chat_page():
     # If user submitted a message via chat_input.
     if prompt:
         # Add user message to chat history.
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        add_chat_message("user", prompt)
         # Immediately render user's message.
         with st.chat_message("user"):
             st.markdown(prompt)
@@ -188,49 +297,71 @@ def chat_page():
             assistant_text = "Model not initialized. Please set GROQ_API_KEY in your environment and restart the app."
             with st.chat_message("assistant"):
                 st.markdown(assistant_text)
-            st.session_state.messages.append({"role": "assistant", "content": assistant_text})
+            add_chat_message("assistant", assistant_text)
             st.stop()
 
-        # Build retrieval context.
-        retrieval_context = build_context_for_query(prompt, top_k=4)
-        used_fallback_search = False
-
-        # If no docs found, attempt fallback web search snippets.
-        if not retrieval_context:
-            snippets = serpapi_search(prompt, num_results=3)
-            if snippets:
-                retrieval_context = "\n\n".join(snippets)
-                used_fallback_search = True
-
         # Prepare system prompt and response mode.
         system_prompt = st.session_state.get("system_prompt", "")
         response_mode = st.session_state.get("response_mode", "Detailed").lower()
 
-        # Call the model and show a spinner.
-        # Call the model and show a spinner.
-        with st.chat_message("assistant"):
-            with st.spinner("Getting response from model..."):
-                try:
-                    response_text = get_chat_response(
-                        chat_model,
-                        st.session_state.messages,
-                        system_prompt,
-                        retrieval_context,
-                        response_mode
-                    )
-                except Exception as e:
-                    response_text = f"Error while generating response: {str(e)}"
+        # Answer paraphrases of earlier questions straight from the semantic cache. Only the
+        # first turn is cached: follow-ups ("Why?") depend on the conversation so far. The tag
+        # ties answers to the mode and persona they were written under.
+        cache_tag = (response_mode, system_prompt.strip())
+        use_cache = len(st.session_state.formatted_history) == 1
+        try:
+            from utils.rag_utils import embed_query
+            from utils.semantic_cache import get_semantic_cache
+            query_vec = embed_query(prompt)
+            cached_text = get_semantic_cache().lookup(query_vec, tag=cache_tag) if use_cache else None
+        except Exception:
+            query_vec, cached_text = None, None
+        if cached_text is not None:
+            with st.chat_message("assistant"):
+                st.markdown(f"**_⚡ Cached Answer_**\n\n{cached_text}")
+            add_chat_message("assistant", cached_text)
+            st.stop()
+
+        # Build retrieval context, with the web search running alongside as a fallback.
+        retrieval_context, used_fallback_search = gather_context(prompt, query_vec=query_vec, chat_model=chat_model)
 
-                # Add mode + fallback tags
-                mode_label = "📝 Concise Mode" if response_mode == "concise" else "📖 Detailed Mode"
-                if used_fallback_search:
-                    mode_label += " + 🌍 Web Search"
+        # Add mode + fallback tags
+        mode_label = "📝 Concise Mode" if response_mode == "concise" else "📖 Detailed Mode"
+        if used_fallback_search:
+            mode_label += " + 🌍 Web Search"
 
-                # Show final output
-                st.markdown(f"**_{mode_label}_**\n\n{response_text}")
+        # Stream the model output into a placeholder as tokens arrive.
+        failed = False
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown(f"**_{mode_label}_**\n\n_Getting response from model..._")
+            acc = []
+            try:
+                for tok in get_chat_response_stream(
+                    chat_model,
+                    st.session_state.formatted_history,
+                    system_prompt,
+                    retrieval_context,
+                    response_mode
+                ):
+                    acc.append(tok)
+                    placeholder.markdown(f"**_{mode_label}_**\n\n{''.join(acc)}▌")
+                response_text = "".join(acc)
+            except Exception as e:
+                tb = traceback.format_exc()
+                response_text = f"Error getting response: {str(e)}.\n\nTraceback:\n{tb}"
+                failed = True
+
+            # Show final output
+            placeholder.markdown(f"**_{mode_label}_**\n\n{response_text}")
 
         # Add assistant response to chat history.
-        st.session_state.messages.append({"role": "assistant", "content": response_text})
+        add_chat_message("assistant", response_text)
+
+        # Remember successful answers for similar future questions.
+        if use_cache and query_vec is not None and not failed and response_text:
+            from utils.semantic_cache import get_semantic_cache
+            get_semantic_cache().add(query_vec, prompt, response_text, tag=cache_tag)
 
 # --- Main app layout and sidebar controls -----------------------------------------------
 
@@ -245,6 +376,8 @@ def main():
     # Ensure session keys exist so sidebar widgets can bind to them.
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "formatted_history" not in st.session_state:
+        st.session_state.formatted_history = []
     if "response_mode" not in st.session_state:
         st.session_state.response_mode = "Detailed"
     if "system_prompt" not in st.session_state:
@@ -271,7 +404,7 @@ def main():
 
         st.divider()
 
-        # Upload area for documents to index into ChromaDB.
+        # Upload area for documents to index into the FAISS store.
         st.markdown("### Upload documents to index")
         uploaded_files = st.file_uploader("Upload text files to index (txt, md, pdf). Use 'Index uploaded files' to add them to the vector DB.", type=['txt', 'md', 'pdf'], accept_multiple_files=True)
 
@@ -280,50 +413,36 @@ def main():
                 st.info("No files selected.")
             else:
                 to_index = []
-                for file in uploaded_files:
-                    try:
-                        fname = file.name
-                        # Handle PDF using PyPDF2 if available.
-                        if fname.lower().endswith(".pdf"):
-                            try:
-                                import PyPDF2
-                                reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
-                                text_pages = []
-                                for p in reader.pages:
-                                    try:
-                                        text_pages.append(p.extract_text() or "")
-                                    except Exception:
-                                        text_pages.append("")
-                                full_text = "\n".join(text_pages)
-                            except Exception:
-                                # Fallback: try to decode bytes as text.
-                                try:
-                                    full_text = file.getvalue().decode("utf-8", errors="ignore")
-                                except Exception:
-                                    full_text = ""
-                        else:
-                            # Text/markdown files.
-                            try:
-                                full_text = file.getvalue().decode("utf-8", errors="ignore")
-                            except Exception:
-                                full_text = str(file.getvalue())
-
-                        if not full_text.strip():
-                            st.warning(f"File `{fname}` yielded no text and will be skipped.")
+                # PyMuPDF is CPU-bound and not thread-safe, so PDFs are parsed in separate processes
+                # ("spawn" avoids forking Streamlit's threads); chunking runs in a thread pool.
+                n_pdfs = sum(file.name.lower().endswith(".pdf") for file in uploaded_files)
+                pdf_pool_ctx = nullcontext()
+                if n_pdfs:
+                    pdf_pool_ctx = ProcessPoolExecutor(
+                        max_workers=min(os.cpu_count() or 1, n_pdfs),
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                # Parse and chunk files in parallel; Streamlit calls stay on this thread.
+                with pdf_pool_ctx as pdf_pool, ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as ex:
+                    futures = [ex.submit(_parse_and_chunk, file.getvalue(), file.name, pdf_pool) for file in uploaded_files]
+                    for file, fut in zip(uploaded_files, futures):
+                        try:
+                            docs = fut.result()
+                        except Exception as e:
+                            st.error(f"Failed to process file {file.name}: {e}")
                             continue
-
-                        # Chunk and prepare docs for indexing.
-                        chunks = chunk_text(full_text, chunk_size=500, overlap=50)
-                        for i, c in enumerate(chunks):
-                            doc = {"id": f"{fname}_chunk_{i}", "text": c, "meta": {"source": fname, "chunk": i}}
-                            to_index.append(doc)
-
-                    except Exception as e:
-                        st.error(f"Failed to process file {file.name}: {e}")
+                        if not docs:
+                            st.warning(f"File `{file.name}` yielded no text and will be skipped.")
+                            continue
+                        to_index.extend(docs)
 
                 if to_index:
                     try:
+                        from utils.rag_utils import index_documents
+                        from utils.semantic_cache import get_semantic_cache
                         index_documents(to_index, collection_name="docs")
+                        # Cached answers may be stale now that the document set changed.
+                        get_semantic_cache().clear()
                         st.success(f"Indexed {len(to_index)} chunks from {len(uploaded_files)} files.")
                     except Exception as e:
                         st.error(f"Indexing failed: {e}")
@@ -333,6 +452,7 @@ def main():
         # Clear chat history.
         if st.button("🗑️ Clear Chat History", use_container_width=True):
             st.session_state.messages = []
+            st.session_state.formatted_history = []
             st.rerun()
 
     # Route pages.
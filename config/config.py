@@ -1,12 +1,24 @@
 # config/config.py.
 # Put API keys here as environment variables or import them from os.environ.
 import os
+import logging
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Unknown LOG_LEVEL values fall back to INFO instead of failing at import.
+_log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=_log_level if isinstance(logging.getLevelName(_log_level), int) else "INFO")
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")  # default model, change as needed.
-CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")  # where Chroma persists.
+FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "./faiss_index")  # where the FAISS vector store persists.
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none").lower()  # none, fp16 or int8 storage for the vector store.
 EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")  # local or remote.
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "")  # e.g. cuda or cpu; empty picks CUDA when available.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()  # torch or onnx.
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")  # optional ONNX export, e.g. onnx/model_qint8_avx2.onnx.
 SERPAPI_KEY = os.getenv("SERPAPI_KEY", "")
+SPECULATIVE_WEB_SEARCH = os.getenv("SPECULATIVE_WEB_SEARCH", "false").lower() == "true"  # opt-in: start the (billed) web search alongside retrieval.
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "./semantic_cache/index.faiss")  # where the query cache persists.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # min cosine similarity for a cache hit.
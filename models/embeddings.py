@@ -1,17 +1,56 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
 
 # models/embeddings.py.
+def _default_device():
+    """Pick CUDA when a GPU is visible, otherwise CPU."""
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
 class EmbeddingModel:
-    """Wrapper around a sentence-transformers model to produce vectors."""
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    """Wrapper around a sentence-transformers model to produce vectors.
+
+    backend="onnx" runs the model through onnxruntime (requires `optimum[onnxruntime]`);
+    onnx_file selects a specific export such as "onnx/model_qint8_avx2.onnx" for INT8 on CPU.
+    """
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", device=None, backend="torch", onnx_file=None):
+        # Imported here so torch is only loaded once an embedding model is actually needed.
+        from sentence_transformers import SentenceTransformer
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        self.device = device or _default_device()
+        self.backend = backend
+        model_kwargs = {}
+        if backend == "onnx":
+            if onnx_file:
+                model_kwargs["file_name"] = onnx_file
+            if self.device == "cuda":
+                model_kwargs["provider"] = "CUDAExecutionProvider"
+        self.model = SentenceTransformer(model_name, device=self.device, backend=backend, model_kwargs=model_kwargs or None)
+
+    def embed_texts(self, texts, batch_size=64):
+        """Return an (N, d) float32 array of L2-normalized vectors for the provided texts."""
+        if isinstance(texts, str):
+            texts = [texts]
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
 
-    def embed_texts(self, texts):
-        """Return list of vectors for the provided texts."""
+    def embed_texts_bucketed(self, texts, bucket_size=64):
+        """Embed texts in buckets of similar length and return vectors in the original order."""
         if isinstance(texts, str):
             texts = [texts]
-        embeddings = self.model.encode(texts, show_progress_bar=False)
-        # ensure numpy arrays
-        return [np.array(vec).astype(float) for vec in embeddings]
+        if not texts:
+            return self.embed_texts(texts)
+        # Sorting by length keeps each bucket's padding close to its longest member.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = None
+        for start in range(0, len(order), bucket_size):
+            bucket = order[start:start + bucket_size]
+            vecs = self.embed_texts([texts[i] for i in bucket], batch_size=bucket_size)
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[bucket] = vecs
+        return out
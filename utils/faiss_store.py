@@ -0,0 +1,137 @@
+import os
+import pickle
+import logging
+import threading
+from functools import lru_cache
+
+import faiss
+import numpy as np
+from config.config import FAISS_INDEX_DIR, EMBEDDING_QUANTIZATION
+
+# utils/faiss_store.py
+
+logger = logging.getLogger(__name__)
+
+
+class FaissStore:
+    """Inner-product vector store: a FAISS index plus a parallel list of documents.
+
+    Row i of the index holds the embedding of ids[i] / texts[i] / metas[i]. Embeddings are
+    expected to be L2-normalized, so scores are cosine similarities. `quantization` picks how
+    vectors are stored: "none" (float32), "fp16" (half the bytes) or "int8" (a quarter).
+    """
+    def __init__(self, path, quantization="none"):
+        if quantization not in ("none", "fp16", "int8"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.path = path
+        self.quantization = quantization
+        self.index = None
+        self.ids = []
+        self.texts = []
+        self.metas = []
+        self._id_set = set()
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, texts, metas, vecs):
+        """Append documents and their embeddings, skipping ids that are already stored or repeated."""
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        with self._lock:
+            keep, seen = [], set()
+            for i, doc_id in enumerate(ids):
+                if doc_id in self._id_set or doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                keep.append(i)
+            if len(keep) < len(ids):
+                logger.warning("Skipping %d documents with existing or duplicate ids.", len(ids) - len(keep))
+            if not keep:
+                return 0
+            if self.index is None:
+                self.index = self._new_index(vecs.shape[1])
+            self.index.add(vecs[keep])
+            for i in keep:
+                self.ids.append(ids[i])
+                self.texts.append(texts[i])
+                self.metas.append(metas[i])
+                self._id_set.add(ids[i])
+            self._save()
+            return len(keep)
+
+    def query(self, vec, k=4, with_vectors=False):
+        """Return up to k stored documents with the highest inner product to vec, best first.
+
+        With with_vectors=True each hit also carries its stored embedding under "vector".
+        """
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return []
+            q = np.ascontiguousarray(np.asarray(vec, dtype=np.float32).reshape(1, -1))
+            scores, rows = self.index.search(q, min(k, self.index.ntotal))
+            hits = []
+            for score, row in zip(scores[0], rows[0]):
+                if row < 0:
+                    continue
+                hits.append({"id": self.ids[row], "text": self.texts[row], "meta": self.metas[row], "score": float(score)})
+            if with_vectors and hits:
+                found = rows[0][rows[0] >= 0]
+                vectors = self.index.reconstruct_batch(found)
+                for hit, vector in zip(hits, vectors):
+                    hit["vector"] = vector
+            return hits
+
+    def _new_index(self, dim):
+        """Create an empty index for the configured quantization, training it if needed."""
+        if self.quantization == "none":
+            return faiss.IndexFlatIP(dim)
+        if self.quantization == "fp16":
+            return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        # int8: embeddings are L2-normalized, so every component lies in [-1, 1]. Train on those
+        # bounds rather than on the first upload, whose range may be narrow or even zero-width.
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        index.sq.rangestat = faiss.ScalarQuantizer.RS_minmax
+        index.sq.rangestat_arg = 0.0
+        index.train(np.vstack([-np.ones(dim), np.ones(dim)]).astype(np.float32))
+        return index
+
+    def _save(self):
+        """Write the index and the document sidecar next to each other."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Write under temporary names and swap into place so readers never see a partial file.
+        faiss.write_index(self.index, self.path + ".faiss.tmp")
+        with open(self.path + ".pkl.tmp", "wb") as f:
+            pickle.dump({"ids": self.ids, "texts": self.texts, "metas": self.metas}, f)
+        os.replace(self.path + ".faiss.tmp", self.path + ".faiss")
+        os.replace(self.path + ".pkl.tmp", self.path + ".pkl")
+
+    def _load(self):
+        """Load a previously saved store, starting empty if none exists."""
+        index_file, sidecar = self.path + ".faiss", self.path + ".pkl"
+        if not (os.path.exists(index_file) and os.path.exists(sidecar)):
+            return
+        try:
+            index = faiss.read_index(index_file)
+            with open(sidecar, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logger.warning("Failed to load FAISS store %s: %s", self.path, e)
+            return
+        # A crash between the two renames in _save can still leave the files out of step.
+        if not (index.ntotal == len(state["ids"]) == len(state["texts"]) == len(state["metas"])):
+            logger.warning(
+                "FAISS store %s is inconsistent (%d vectors, %d documents); starting empty.",
+                self.path, index.ntotal, len(state["ids"]),
+            )
+            return
+        self.index = index
+        self.ids, self.texts, self.metas = state["ids"], state["texts"], state["metas"]
+        self._id_set = set(self.ids)
+
+
+@lru_cache(maxsize=8)
+def get_store(collection_name="docs", persist_directory=FAISS_INDEX_DIR, quantization=EMBEDDING_QUANTIZATION):
+    """Return the shared FaissStore for a collection, loading it from disk on first use."""
+    return FaissStore(os.path.join(persist_directory, collection_name), quantization=quantization)
@@ -0,0 +1,19 @@
+import threading
+
+# utils/pdf_utils.py
+
+# PyMuPDF is not thread-safe. The lock lives in this imported module (not app.py, which
+# Streamlit re-executes on every rerun) so all sessions in the process share it.
+_PDF_LOCK = threading.Lock()
+
+def extract_pdf_pages(file_bytes):
+    """Return (page number, text) pairs for a PDF using PyMuPDF."""
+    import pymupdf
+    pages = []
+    with _PDF_LOCK, pymupdf.open(stream=file_bytes, filetype="pdf") as doc:
+        for page_no, page in enumerate(doc, start=1):
+            try:
+                pages.append((page_no, page.get_text("text")))
+            except Exception:
+                pages.append((page_no, ""))
+    return pages
@@ -1,88 +1,143 @@
-# utils/rag_utils.py (updated for Chroma >= 0.5)
+# utils/rag_utils.py
 
-import os
 import logging
-import sys
-
-# Patch the standard sqlite3 module with pysqlite3 to ensure compatibility with ChromaDB, which requires SQLite version >= 3.35.0 (often not available in default Python builds) for streamlit cloud.
-
-try:
-    import pysqlite3 # type: ignore
-    sys.modules["sqlite3"] = sys.modules["pysqlite3"]
-except ImportError:
-    pass
-
-import chromadb
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import tiktoken
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 from models.embeddings import EmbeddingModel
-from config.config import CHROMA_PERSIST_DIR, EMBEDDING_MODEL_NAME
+from utils.faiss_store import get_store
+from utils.ranker import mmr
+from config.config import EMBEDDING_MODEL_NAME, EMBEDDING_DEVICE, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE
 
 logger = logging.getLogger(__name__)
 
-def get_chroma_client(persist_directory=CHROMA_PERSIST_DIR):
-    """Return a Chroma PersistentClient (new API)."""
-    os.makedirs(persist_directory, exist_ok=True)
-    client = chromadb.PersistentClient(path=persist_directory)
-    return client
-
-def chunk_text(text, chunk_size=500, overlap=50):
-    """Split long text into overlapping chunks."""
-    chunks = []
-    start = 0
-    length = len(text)
-    while start < length:
-        end = min(start + chunk_size, length)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start += chunk_size - overlap
-    return chunks
+# Pool for concurrent context lookups in app.py. It lives here because Streamlit re-executes
+# app.py on every rerun; and unlike asyncio's default executor, asyncio.run does not wait for
+# it on exit, so a discarded web search never delays the answer.
+CONTEXT_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="context")
+
+HYDE_CACHE_SIZE = 256
+_hyde_cache = OrderedDict()
+_hyde_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _get_embedder(name=EMBEDDING_MODEL_NAME):
+    """Return a shared EmbeddingModel so the weights are loaded only once per process."""
+    return EmbeddingModel(
+        name,
+        device=EMBEDDING_DEVICE or None,
+        backend=EMBEDDING_BACKEND,
+        onnx_file=EMBEDDING_ONNX_FILE or None,
+    )
 
-def index_documents(docs, collection_name="docs"):
-    """Index a list of dicts into ChromaDB."""
-    client = get_chroma_client()
-    try:
-        coll = client.get_or_create_collection(name=collection_name)
-    except Exception as e:
-        raise RuntimeError(f"Failed to create/get collection: {e}")
+def embed_query(query):
+    """Return the embedding of a single query as a float32 vector."""
+    return _get_embedder().embed_texts([query])[0]
+
+@lru_cache(maxsize=8)
+def _get_splitter(chunk_size, overlap):
+    """Return a recursive splitter that measures chunk length in cl100k_base tokens."""
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name="cl100k_base",
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+
+def chunk_text(text, chunk_size=300, overlap=30):
+    """Split long text into overlapping chunks of at most chunk_size tokens, preferring paragraph and sentence boundaries."""
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+    return _get_splitter(chunk_size, overlap).split_text(text)
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Return the cl100k_base tokenizer used to budget context tokens."""
+    return tiktoken.get_encoding("cl100k_base")
+
+def _shingles(text, n=5):
+    """Return the set of word n-grams in text (the whole text if it has fewer than n words)."""
+    words = text.lower().split()
+    if len(words) < n:
+        return {tuple(words)}
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+def select_context_docs(docs, max_tokens=1500, max_jaccard=0.6):
+    """Pick docs closest-first, skipping near-duplicates of already picked ones and stopping at max_tokens."""
+    enc = _get_encoding()
+    selected, selected_shingles, total = [], [], 0
+    for d in sorted(docs, key=lambda d: d.get("distance", 100)):
+        shingles = _shingles(d["text"])
+        if any(len(shingles & s) / len(shingles | s) > max_jaccard for s in selected_shingles):
+            continue
+        n_tokens = len(enc.encode(d["text"]))
+        if total + n_tokens > max_tokens:
+            break
+        selected.append(d)
+        selected_shingles.append(shingles)
+        total += n_tokens
+    return selected
 
-    emb = EmbeddingModel(EMBEDDING_MODEL_NAME)
+def index_documents(docs, collection_name="docs"):
+    """Index a list of dicts into the FAISS vector store."""
+    emb = _get_embedder()
     texts = [d["text"] for d in docs]
     ids = [d["id"] for d in docs]
     metadatas = [d.get("meta", {}) for d in docs]
-    vectors = [vec.tolist() for vec in emb.embed_texts(texts)]
+    vectors = emb.embed_texts_bucketed(texts)
 
     try:
-        coll.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas,
-            embeddings=vectors,
-        )
+        get_store(collection_name).add(ids, texts, metadatas, vectors)
         return True
     except Exception as e:
-        raise RuntimeError(f"Failed to add docs to Chroma: {e}")
-
-def retrieve(query, k=4, collection_name="docs"):
-    """Retrieve top-k documents for a query."""
-    client = get_chroma_client()
-    try:
-        coll = client.get_collection(name=collection_name)
-    except Exception:
-        return []
+        raise RuntimeError(f"Failed to add docs to FAISS store: {e}")
 
-    emb = EmbeddingModel(EMBEDDING_MODEL_NAME)
-    q_vec = emb.embed_texts([query])[0].tolist()  # ✅ ensure list
+def retrieve(query, k=4, collection_name="docs", query_vec=None, fetch_k=None):
+    """Retrieve top-k documents for a query (pass query_vec to reuse an existing embedding).
 
-    results = coll.query(
-        query_embeddings=[q_vec],
-        n_results=k,
-        include=["documents", "metadatas", "distances"]
-    )
-
-    print("DEBUG - Raw retrieval results:", results)  # ✅ extra debug
-
-    docs = []
-    if results and results.get("documents"):
-        for doc, meta, dist in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
-            docs.append({"text": doc, "meta": meta, "distance": dist})
-    return docs
+    The k results are re-ranked with MMR from fetch_k nearest candidates (default 4 * k) so
+    near-duplicate chunks do not crowd out other relevant ones.
+    """
+    store = get_store(collection_name)
+    if not len(store):
+        return []
 
+    if query_vec is None:
+        query_vec = embed_query(query)
+    if fetch_k is None:
+        fetch_k = 4 * k
+
+    results = store.query(query_vec, k=max(k, fetch_k), with_vectors=True)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Raw retrieval results: %r", [(r["id"], r["score"]) for r in results])
+
+    if len(results) > k:
+        order = mmr(query_vec, np.stack([r["vector"] for r in results]), topn=k)
+        results = [results[i] for i in order]
+
+    # Report cosine distance (1 - similarity) so lower still means closer.
+    return [{"text": r["text"], "meta": r["meta"], "distance": 1.0 - r["score"]} for r in results]
+
+def hyde_query(chat_model, query):
+    """Return a hypothetical passage answering the query (HyDE), to embed in place of a short question."""
+    with _hyde_lock:
+        if query in _hyde_cache:
+            _hyde_cache.move_to_end(query)
+            return _hyde_cache[query]
+    response = chat_model.invoke([
+        SystemMessage(content="Write a short hypothetical passage answering the question."),
+        HumanMessage(content=query),
+    ])
+    passage = getattr(response, "content", str(response))
+    with _hyde_lock:
+        _hyde_cache[query] = passage
+        while len(_hyde_cache) > HYDE_CACHE_SIZE:
+            _hyde_cache.popitem(last=False)
+    return passage
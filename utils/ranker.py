@@ -0,0 +1,45 @@
+import numpy as np
+from numba import njit, prange
+
+# utils/ranker.py
+
+
+@njit(parallel=True, cache=True)
+def _mmr_select(rel, sim, lam, topn):
+    """Greedy MMR over precomputed query relevance and pairwise candidate similarity."""
+    n = rel.shape[0]
+    selected = np.empty(topn, dtype=np.int64)
+    chosen = np.zeros(n, dtype=np.bool_)
+    # Highest similarity of each candidate to anything already selected.
+    max_sim = np.zeros(n, dtype=np.float32)
+    scores = np.empty(n, dtype=np.float32)
+    for t in range(topn):
+        for i in prange(n):
+            scores[i] = lam * rel[i] - (1.0 - lam) * max_sim[i]
+        best = -1
+        best_score = -np.inf
+        for i in range(n):
+            if not chosen[i] and scores[i] > best_score:
+                best = i
+                best_score = scores[i]
+        selected[t] = best
+        chosen[best] = True
+        for i in prange(n):
+            if t == 0 or sim[i, best] > max_sim[i]:
+                max_sim[i] = sim[i, best]
+    return selected
+
+
+def mmr(q, V, lam=0.7, topn=4):
+    """Return indices of up to topn rows of V picked by Maximal Marginal Relevance for query q.
+
+    q and V are expected to be L2-normalized, so dot products are cosine similarities.
+    """
+    V = np.ascontiguousarray(V, dtype=np.float32)
+    q = np.ascontiguousarray(q, dtype=np.float32).reshape(-1)
+    topn = min(topn, V.shape[0])
+    if topn == 0:
+        return np.empty(0, dtype=np.int64)
+    rel = V @ q
+    sim = V @ V.T
+    return _mmr_select(rel, sim, np.float32(lam), topn)
@@ -0,0 +1,138 @@
+import os
+import atexit
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import faiss
+import numpy as np
+from config.config import SEMANTIC_CACHE_PATH, SEMANTIC_CACHE_THRESHOLD
+
+# utils/semantic_cache.py
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Cache of assistant responses keyed on the query embedding.
+
+    A new query is a hit when its cosine similarity to a cached query with the same `tag` is at
+    least `threshold`. The tag should capture everything else the answer depended on (e.g. the
+    response mode and system prompt). Entries are evicted least-recently-used once
+    `max_cache_size` is reached.
+    """
+    SEARCH_K = 8  # neighbours checked per lookup when looking for an entry with a matching tag
+    def __init__(self, dim=384, threshold=0.92, max_cache_size=2000, index_path=None):
+        self.dim = dim
+        self.threshold = threshold
+        self.max_cache_size = max_cache_size
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # id -> (response, prompt, tag), ordered from least to most recently used.
+        self._entries = OrderedDict()
+        self.index = self._new_index(dim)
+        if index_path:
+            self._load()
+
+    @staticmethod
+    def _new_index(dim):
+        """Exact inner-product index with stable ids so single entries can be evicted."""
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    @staticmethod
+    def _normalize(vec):
+        """Return a (1, d) contiguous float32 row with unit L2 norm."""
+        vec = np.ascontiguousarray(np.asarray(vec, dtype=np.float32).reshape(1, -1))
+        faiss.normalize_L2(vec)
+        return vec
+
+    def lookup(self, vec, tag=None):
+        """Return the cached response for the nearest query with a matching tag, or None on a miss."""
+        with self._lock:
+            vec = self._normalize(vec)
+            if self.index.ntotal == 0 or vec.shape[1] != self.dim:
+                return None
+            scores, ids = self.index.search(vec, min(self.SEARCH_K, self.index.ntotal))
+            # Results are sorted by score, so the first matching entry is the best one.
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None or entry[2] != tag:
+                    continue
+                self._entries.move_to_end(int(entry_id))
+                return entry[0]
+            return None
+
+    def add(self, vec, prompt, response, tag=None):
+        """Store a response for the given query embedding, evicting the LRU entry if full."""
+        with self._lock:
+            vec = self._normalize(vec)
+            if vec.shape[1] != self.dim:
+                if self.index.ntotal:
+                    return
+                # Empty cache: adopt the dimension of the configured embedding model.
+                self.dim = vec.shape[1]
+                self.index = self._new_index(self.dim)
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(vec, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (response, prompt, tag)
+            while len(self._entries) > self.max_cache_size:
+                old_id, _ = self._entries.popitem(last=False)
+                self.index.remove_ids(np.array([old_id], dtype=np.int64))
+
+    def clear(self):
+        """Drop every cached entry (e.g. after new documents are indexed)."""
+        with self._lock:
+            self.index.reset()
+            self._entries.clear()
+
+    def save(self):
+        """Persist the FAISS index and the response sidecar to `index_path`."""
+        if not self.index_path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            # Write both files under temporary names first so a crash never leaves a half-saved pair.
+            faiss.write_index(self.index, self.index_path + ".tmp")
+            with open(self.index_path + ".pkl.tmp", "wb") as f:
+                pickle.dump({"next_id": self._next_id, "entries": self._entries}, f)
+            os.replace(self.index_path + ".tmp", self.index_path)
+            os.replace(self.index_path + ".pkl.tmp", self.index_path + ".pkl")
+
+    def _load(self):
+        """Load a previously saved cache, ignoring missing or unreadable files."""
+        sidecar = self.index_path + ".pkl"
+        if not (os.path.exists(self.index_path) and os.path.exists(sidecar)):
+            return
+        try:
+            index = faiss.read_index(self.index_path)
+            with open(sidecar, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logger.warning("Failed to load semantic cache: %s", e)
+            return
+        if index.ntotal != len(state["entries"]):
+            logger.warning("Semantic cache index and sidecar disagree (%d vs %d entries); starting empty.", index.ntotal, len(state["entries"]))
+            return
+        self.dim = index.d
+        self.index = index
+        self._next_id = state["next_id"]
+        self._entries = state["entries"]
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache():
+    """Return the process-wide semantic cache of previous answers, saved to disk at exit.
+
+    Lives here rather than in app.py because Streamlit re-executes the app script on every
+    rerun, which would reset a cache held there; imported modules are loaded only once.
+    """
+    cache = SemanticCache(index_path=SEMANTIC_CACHE_PATH, threshold=SEMANTIC_CACHE_THRESHOLD)
+    if SEMANTIC_CACHE_PATH:
+        atexit.register(cache.save)
+    return cache
@@ -1,5 +1,8 @@
 import os
 import requests
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config.config import SERPAPI_KEY
 import logging
 
@@ -7,25 +10,43 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-def serpapi_search(query, num_results=3):
-    """Return a list of text snippets from SerpAPI results. Requires SERPAPI_KEY environment variable."""
-    if not SERPAPI_KEY:
-        logger.warning("SERPAPI_KEY not configured.")
-        return []
+# Shared session so consecutive searches reuse the pooled TLS connection to SerpAPI.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+))
+_session.headers.update({"Accept-Encoding": "gzip"})
+
+@lru_cache(maxsize=512)
+def _cached_search(query, num_results):
+    """Query SerpAPI and return snippets as a tuple; raises on failure so errors are not cached."""
     params = {
         "q": query,
         "api_key": SERPAPI_KEY,
         "engine": "google",
         "num": num_results,
     }
+    resp = _session.get("https://serpapi.com/search.json", params=params, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+    snippets = []
+    for r in data.get("organic_results", [])[:num_results]:
+        snippet = r.get("snippet") or r.get("title") or r.get("snippet_text") or ""
+        snippets.append(snippet)
+    return tuple(snippets)
+
+def serpapi_search(query, num_results=3):
+    """Return a list of text snippets from SerpAPI results. Requires SERPAPI_KEY environment variable."""
+    if not SERPAPI_KEY:
+        logger.warning("SERPAPI_KEY not configured.")
+        return []
     try:
-        resp = requests.get("https://serpapi.com/search.json", params=params, timeout=10)
-        data = resp.json()
-        snippets = []
-        for r in data.get("organic_results", [])[:num_results]:
-            snippet = r.get("snippet") or r.get("title") or r.get("snippet_text") or ""
-            snippets.append(snippet)
-        return snippets
+        snippets = list(_cached_search(query, num_results))
     except Exception as e:
-        logger.error(f"Web search failed: {e}")
+        logger.error("Web search failed: %s", e)
         return []
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Web search results for %r: %r", query, snippets)
+    return snippets